@@ -1,5 +1,6 @@
 from . import digest
+from . import inventory
 from . import reference
 from . import regexp
 
-__all__ = ['digest', 'regexp', 'reference']
+__all__ = ['digest', 'inventory', 'regexp', 'reference']
@@ -0,0 +1,176 @@
+import collections
+import heapq
+import io
+import itertools
+import os
+import shutil
+import tempfile
+
+from . import reference
+
+DEFAULT_CHUNK_SIZE = 100000
+DEFAULT_FAN_IN = 64
+
+ADDED = 'added'
+REMOVED = 'removed'
+CHANGED = 'changed'
+
+# Normalized references are stored as "name\ttag\tdigest" lines. A tab sorts
+# before every character allowed in a name, tag or digest, so ordering the
+# encoded strings orders the (name, tag, digest) tuples as well.
+FIELD_SEPARATOR = '\t'
+
+
+class Change(collections.namedtuple('Change', ['action', 'name', 'tag', 'old_digest', 'new_digest'])):
+    __slots__ = ()
+
+
+def _encode(s):
+    ref = reference.Reference.parse_normalized_named(s)
+    return FIELD_SEPARATOR.join((ref['name'], ref['tag'] or '', ref['digest'] or ''))
+
+
+def _decode(line):
+    return tuple(line.split(FIELD_SEPARATOR))
+
+
+def _unique(lines):
+    previous = None
+    for line in lines:
+        if line != previous:
+            yield line
+        previous = line
+
+
+def _write_run(tmpdir, lines):
+    fd, path = tempfile.mkstemp(dir=tmpdir, suffix='.run')
+    # binary mode keeps native strings working on both Python 2 and 3.
+    with io.open(fd, 'wb') as f:
+        for line in lines:
+            f.write(line.encode('utf-8') + b'\n')
+    return path
+
+
+def _read_run(path):
+    with io.open(path, 'rb') as f:
+        for line in f:
+            yield str(line[:-1].decode('utf-8'))
+
+
+def _merge_runs(paths):
+    return _unique(heapq.merge(*[_read_run(path) for path in paths]))
+
+
+def sort_references(references, chunk_size=DEFAULT_CHUNK_SIZE, fan_in=DEFAULT_FAN_IN, tmpdir=None):
+    """Normalize and sort references with an external merge sort.
+
+    Yields unique (name, tag, digest) tuples in ascending order, with empty
+    strings for a missing tag or digest. About ``chunk_size`` references are
+    held in memory while sorting; larger inputs are spilled to sorted runs
+    under ``tmpdir`` and merged at most ``fan_in`` runs at a time, keeping
+    one line per open run in memory.
+    """
+    if chunk_size < 1:
+        raise ValueError("chunk_size must be positive")
+    if fan_in < 2:
+        raise ValueError("fan_in must be at least 2")
+
+    workdir = None
+    try:
+        runs = []
+        references = (s.strip() for s in references)
+        references = (s for s in references if s)
+        while True:
+            chunk = [_encode(s) for s in itertools.islice(references, chunk_size)]
+            chunk.sort()
+            if len(chunk) < chunk_size and not runs:
+                # everything fits in memory, no need to touch the disk.
+                for line in _unique(chunk):
+                    yield _decode(line)
+                return
+            if not chunk:
+                break
+            if workdir is None:
+                workdir = tempfile.mkdtemp(prefix='docker-image-', dir=tmpdir)
+            runs.append(_write_run(workdir, _unique(chunk)))
+            del chunk
+
+        while len(runs) > fan_in:
+            merged, runs = runs[:fan_in], runs[fan_in:]
+            runs.append(_write_run(workdir, _merge_runs(merged)))
+            for path in merged:
+                os.remove(path)
+
+        for line in _merge_runs(runs):
+            yield _decode(line)
+    finally:
+        if workdir is not None:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+def _merge_entries(old, new):
+    sentinel = object()
+    old_entry = next(old, sentinel)
+    new_entry = next(new, sentinel)
+    while old_entry is not sentinel or new_entry is not sentinel:
+        if new_entry is sentinel or (old_entry is not sentinel and old_entry < new_entry):
+            yield REMOVED, old_entry
+            old_entry = next(old, sentinel)
+        elif old_entry is sentinel or new_entry < old_entry:
+            yield ADDED, new_entry
+            new_entry = next(new, sentinel)
+        else:
+            old_entry = next(old, sentinel)
+            new_entry = next(new, sentinel)
+
+
+def _change(action, name, tag, digest):
+    if action == REMOVED:
+        return Change(REMOVED, name, tag, digest, '')
+    return Change(ADDED, name, tag, '', digest)
+
+
+def _flush_tag(name, tag, removed, added):
+    # a tag pointing at a different digest is a retag, not a new image.
+    for old_digest, new_digest in zip(removed, added):
+        yield Change(CHANGED, name, tag, old_digest, new_digest)
+    paired = min(len(removed), len(added))
+    for digest in removed[paired:]:
+        yield _change(REMOVED, name, tag, digest)
+    for digest in added[paired:]:
+        yield _change(ADDED, name, tag, digest)
+
+
+def diff_references(old, new, chunk_size=DEFAULT_CHUNK_SIZE, fan_in=DEFAULT_FAN_IN, tmpdir=None):
+    """Stream the differences between two iterables of references.
+
+    Both sides are normalized with ``parse_normalized_named`` and sorted with
+    ``sort_references``, then merged in a single pass. Yields ``Change``
+    records ordered by name and tag: ``added`` and ``removed`` for
+    references present on one side only, and ``changed`` when the same name
+    and tag resolve to a different digest. Removed and added digests of a
+    tag are paired in digest order; references without a digest are never
+    paired. Sorting holds about ``chunk_size`` references per side in
+    memory; the merge only holds the one-sided digests of the current tag,
+    usually one per side.
+    """
+    old_entries = sort_references(old, chunk_size, fan_in, tmpdir)
+    new_entries = sort_references(new, chunk_size, fan_in, tmpdir)
+    key = None
+    removed, added = [], []
+    for action, (name, tag, digest) in _merge_entries(old_entries, new_entries):
+        if (name, tag) != key:
+            if key is not None:
+                for change in _flush_tag(key[0], key[1], removed, added):
+                    yield change
+            key = (name, tag)
+            removed, added = [], []
+        if not tag or not digest:
+            yield _change(action, name, tag, digest)
+        elif action == REMOVED:
+            removed.append(digest)
+        else:
+            added.append(digest)
+    if key is not None:
+        for change in _flush_tag(key[0], key[1], removed, added):
+            yield change
@@ -0,0 +1,155 @@
+import os
+import random
+import shutil
+import tempfile
+import unittest
+
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
+from docker_image import inventory
+from docker_image import reference
+
+
+class TestInventory(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_sort_references(self):
+        digest = 'sha256:{}'.format('f' * 64)
+        refs = ['nginx:latest', 'busybox', 'docker.io/library/nginx:latest', '',
+                'index.docker.io/nginx:1.11', 'test.com/repo@' + digest, 'test.com/repo:tag@' + digest]
+        expected = [
+            ('docker.io/library/busybox', '', ''),
+            ('docker.io/library/nginx', '1.11', ''),
+            ('docker.io/library/nginx', 'latest', ''),
+            ('test.com/repo', '', digest),
+            ('test.com/repo', 'tag', digest),
+        ]
+        self.assertEqual(list(inventory.sort_references(refs)), expected)
+        for chunk_size in (1, 2, 3):
+            sorted_refs = inventory.sort_references(refs, chunk_size=chunk_size, fan_in=2, tmpdir=self.tmpdir)
+            self.assertEqual(list(sorted_refs), expected)
+            self.assertEqual(os.listdir(self.tmpdir), [])
+
+    def test_sort_references_large(self):
+        rnd = random.Random(0)
+        refs = ['repo{}:tag{}'.format(rnd.randint(0, 200), rnd.randint(0, 5)) for _ in range(2000)]
+        expected = sorted(set(('docker.io/library/' + r.split(':')[0], r.split(':')[1], '') for r in refs))
+        sorted_refs = inventory.sort_references(refs, chunk_size=50, fan_in=4, tmpdir=self.tmpdir)
+        self.assertEqual(list(sorted_refs), expected)
+        self.assertEqual(os.listdir(self.tmpdir), [])
+
+    def test_sort_references_invalid(self):
+        with self.assertRaises(reference.InvalidReference):
+            list(inventory.sort_references(['nginx', 'Uppercase'], chunk_size=1, tmpdir=self.tmpdir))
+        self.assertEqual(os.listdir(self.tmpdir), [])
+        with self.assertRaises(ValueError):
+            list(inventory.sort_references(['nginx'], chunk_size=0))
+        with self.assertRaises(ValueError):
+            list(inventory.sort_references(['nginx'], fan_in=1))
+
+    def test_diff_references(self):
+        def digest(c):
+            return 'sha256:{}'.format(c * 64)
+
+        old = [
+            'nginx:1.11',
+            'redis@' + digest('a'),
+            'busybox:latest@' + digest('b'),
+            'test.com/repo:v1@' + digest('d'),
+            'test.com/repo@' + digest('e'),
+        ]
+        new = [
+            'docker.io/library/nginx:1.11',
+            'alpine:3.5',
+            'busybox:latest@' + digest('c'),
+            'test.com/repo:v1@' + digest('d'),
+            'test.com/repo@' + digest('f'),
+        ]
+        expected = [
+            inventory.Change(inventory.ADDED, 'docker.io/library/alpine', '3.5', '', ''),
+            inventory.Change(inventory.CHANGED, 'docker.io/library/busybox', 'latest', digest('b'), digest('c')),
+            inventory.Change(inventory.REMOVED, 'docker.io/library/redis', '', digest('a'), ''),
+            inventory.Change(inventory.REMOVED, 'test.com/repo', '', digest('e'), ''),
+            inventory.Change(inventory.ADDED, 'test.com/repo', '', '', digest('f')),
+        ]
+        self.assertEqual(list(inventory.diff_references(old, new)), expected)
+        changes = inventory.diff_references(old, new, chunk_size=1, fan_in=2, tmpdir=self.tmpdir)
+        self.assertEqual(list(changes), expected)
+        self.assertEqual(os.listdir(self.tmpdir), [])
+
+    def test_diff_references_empty(self):
+        self.assertEqual(list(inventory.diff_references([], [])), [])
+        self.assertEqual(list(inventory.diff_references(['nginx'], ['nginx'])), [])
+        self.assertEqual(list(inventory.diff_references([], ['nginx'])),
+                         [inventory.Change(inventory.ADDED, 'docker.io/library/nginx', '', '', '')])
+        self.assertEqual(list(inventory.diff_references(['nginx'], [])),
+                         [inventory.Change(inventory.REMOVED, 'docker.io/library/nginx', '', '', '')])
+
+    def test_diff_references_streams_untagged_digests(self):
+        count = 1000
+
+        def digests(offset):
+            for i in range(count):
+                yield 'test.com/repo@sha256:{:064x}'.format(2 * i + offset)
+
+        sort_references = inventory.sort_references
+        pulled = []
+
+        def counting_sort_references(*args, **kwargs):
+            for entry in sort_references(*args, **kwargs):
+                pulled.append(entry)
+                yield entry
+
+        with mock.patch.object(inventory, 'sort_references', side_effect=counting_sort_references):
+            changes = inventory.diff_references(digests(0), digests(1), chunk_size=10, tmpdir=self.tmpdir)
+            first = next(changes)
+            # only the heads of both sorted sides are read before the first record.
+            self.assertLessEqual(len(pulled), 3)
+            rest = list(changes)
+
+        self.assertEqual(first, inventory.Change(inventory.REMOVED, 'test.com/repo', '', 'sha256:{:064x}'.format(0), ''))
+        self.assertEqual(len(rest), 2 * count - 1)
+        self.assertEqual(set(change.action for change in rest), set([inventory.ADDED, inventory.REMOVED]))
+        self.assertEqual(os.listdir(self.tmpdir), [])
+
+    def test_diff_references_retags(self):
+        def digest(c):
+            return 'sha256:{}'.format(c * 64)
+
+        def retags(old_digests, new_digests):
+            old = ['nginx:latest@' + digest(c) for c in old_digests]
+            new = ['nginx:latest@' + digest(c) for c in new_digests]
+            return list(inventory.diff_references(old, new, chunk_size=1, fan_in=2, tmpdir=self.tmpdir))
+
+        def changed(old_digest, new_digest):
+            return inventory.Change(inventory.CHANGED, 'docker.io/library/nginx', 'latest',
+                                    digest(old_digest), digest(new_digest))
+
+        # the result must not depend on how the digests of both sides interleave.
+        self.assertEqual(retags('ac', 'bd'), [changed('a', 'b'), changed('c', 'd')])
+        self.assertEqual(retags('ab', 'cd'), [changed('a', 'c'), changed('b', 'd')])
+        self.assertEqual(retags('cd', 'ab'), [changed('c', 'a'), changed('d', 'b')])
+        self.assertEqual(retags('abc', 'bd'), [changed('a', 'd'),
+                                               inventory.Change(inventory.REMOVED, 'docker.io/library/nginx',
+                                                                'latest', digest('c'), '')])
+
+        old = ['redis:3@' + digest('e'), 'nginx:1.11', 'alpine:3.5@' + digest('f')]
+        new = ['redis:4@' + digest('e'), 'nginx:1.11@' + digest('a'), 'alpine:3.5']
+        expected = [
+            inventory.Change(inventory.ADDED, 'docker.io/library/alpine', '3.5', '', ''),
+            inventory.Change(inventory.REMOVED, 'docker.io/library/alpine', '3.5', digest('f'), ''),
+            inventory.Change(inventory.REMOVED, 'docker.io/library/nginx', '1.11', '', ''),
+            inventory.Change(inventory.ADDED, 'docker.io/library/nginx', '1.11', '', digest('a')),
+            inventory.Change(inventory.REMOVED, 'docker.io/library/redis', '3', digest('e'), ''),
+            inventory.Change(inventory.ADDED, 'docker.io/library/redis', '4', '', digest('e')),
+        ]
+        self.assertEqual(list(inventory.diff_references(old, new, chunk_size=1, fan_in=2, tmpdir=self.tmpdir)),
+                         expected)
+        self.assertEqual(os.listdir(self.tmpdir), [])